@@ -2,43 +2,71 @@
 from __future__ import annotations
 
 import argparse
+import base64
 import csv
+import http.client
 import json
 import os
+import threading
 import time
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import urllib.request
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ThreadPoolExecutor,
+    as_completed,
+    wait,
+)
 from dataclasses import dataclass
+from functools import lru_cache
 from pathlib import Path
 from typing import Iterable
-from urllib.error import HTTPError, URLError
-from urllib.request import Request, urlopen
+from urllib.parse import unquote, urljoin, urlsplit
 
 
 DEFAULT_BASE_URL = "http://www.blissymbolics.net/png_h188_doc"
+REDIRECT_CODES = {301, 302, 303, 307, 308}
+MAX_REDIRECTS = 5
+VALIDATORS_FILENAME = ".etags.json"
+BUFFER_SIZE = 256 * 1024
+
+# One keep-alive connection per (worker thread, host), so consecutive downloads
+# skip the TCP (and TLS) handshake instead of reconnecting for every PNG, plus
+# one reusable read buffer per worker thread. Every thread's connection map is
+# also registered in _pools so main() can close them once the pool is done.
+_local = threading.local()
+_pools: list[dict[tuple[str, str], http.client.HTTPConnection]] = []
+_pools_lock = threading.Lock()
 
 
 def iter_ids_from_csv(csv_path: Path, id_column: str = "BCI-AV#") -> list[int]:
-    ids: list[int] = []
+    ids: set[int] = set()
     with csv_path.open("r", encoding="utf-8", newline="") as f:
-        reader = csv.DictReader(f)
-        if not reader.fieldnames or id_column not in reader.fieldnames:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if not header or id_column not in header:
             raise SystemExit(
                 f"CSV {csv_path} is missing expected id column {id_column!r}. "
-                f"Found columns: {reader.fieldnames}"
+                f"Found columns: {header}"
             )
+        # Only the id column is needed, so index it directly instead of
+        # building a dict for every row.
+        id_idx = header.index(id_column)
         for row in reader:
-            raw = (row.get(id_column) or "").strip()
+            if len(row) <= id_idx:
+                continue
+            raw = row[id_idx].strip()
             if not raw:
                 continue
             try:
-                ids.append(int(raw))
+                ids.add(int(raw))
             except ValueError:
                 continue
-    return sorted(set(ids))
+    return sorted(ids)
 
 
 def parse_ids_arg(ids_arg: str) -> list[int]:
-    out: list[int] = []
+    out: set[int] = set()
     for part in ids_arg.split(","):
         part = part.strip()
         if not part:
@@ -49,16 +77,135 @@ def parse_ids_arg(ids_arg: str) -> list[int]:
             hi = int(hi_s.strip())
             if hi < lo:
                 lo, hi = hi, lo
-            out.extend(range(lo, hi + 1))
+            out.update(range(lo, hi + 1))
         else:
-            out.append(int(part))
-    return sorted(set(out))
+            out.add(int(part))
+    return sorted(out)
 
 
 def ensure_dir(path: Path) -> None:
     path.mkdir(parents=True, exist_ok=True)
 
 
+def load_validators(out_dir: Path) -> dict[str, dict[str, str]]:
+    path = out_dir / VALIDATORS_FILENAME
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def save_validators(out_dir: Path, validators: dict[str, dict[str, str]]) -> None:
+    path = out_dir / VALIDATORS_FILENAME
+    tmp_path = out_dir / f"{VALIDATORS_FILENAME}.part"
+    tmp_path.write_text(json.dumps(validators, indent=2, sort_keys=True), encoding="utf-8")
+    os.replace(tmp_path, path)
+
+
+def _connections() -> dict[tuple[str, str], http.client.HTTPConnection]:
+    conns = getattr(_local, "conns", None)
+    if conns is None:
+        conns = _local.conns = {}
+        with _pools_lock:
+            _pools.append(conns)
+    return conns
+
+
+def _scratch_buffer() -> memoryview:
+    buf = getattr(_local, "buf", None)
+    if buf is None:
+        buf = _local.buf = memoryview(bytearray(BUFFER_SIZE))
+    return buf
+
+
+def _reset_connections() -> None:
+    conns = _connections()
+    for conn in conns.values():
+        conn.close()
+    conns.clear()
+
+
+def close_connections() -> None:
+    with _pools_lock:
+        for conns in _pools:
+            for conn in conns.values():
+                conn.close()
+            conns.clear()
+        _pools.clear()
+
+
+@lru_cache(maxsize=None)
+def _proxy_for(scheme: str, netloc: str) -> tuple[str, tuple[tuple[str, str], ...]] | None:
+    # Same environment lookup urlopen's ProxyHandler does (HTTP_PROXY,
+    # HTTPS_PROXY, NO_PROXY, ...). Returns the proxy's host:port and any
+    # Proxy-Authorization header, or None to connect directly.
+    proxy = urllib.request.getproxies().get(scheme)
+    if not proxy or urllib.request.proxy_bypass(urlsplit(f"//{netloc}").hostname or netloc):
+        return None
+    parts = urlsplit(proxy if "://" in proxy else f"http://{proxy}")
+    auth: tuple[tuple[str, str], ...] = ()
+    if parts.username:
+        creds = f"{unquote(parts.username)}:{unquote(parts.password or '')}"
+        auth = (("Proxy-Authorization", "Basic " + base64.b64encode(creds.encode()).decode()),)
+    return parts.netloc.rpartition("@")[2], auth
+
+
+def _send(
+    scheme: str, netloc: str, target: str, headers: dict[str, str], timeout_s: float
+) -> http.client.HTTPResponse:
+    if scheme not in {"http", "https"}:
+        raise ValueError(f"unsupported URL scheme: {scheme!r}")
+    proxy = _proxy_for(scheme, netloc)
+    if proxy is not None and scheme == "http":
+        # Plain HTTP goes through the proxy with an absolute request target.
+        target = f"http://{netloc}{target}"
+        headers = {**headers, **dict(proxy[1])}
+    conns = _connections()
+    key = (scheme, netloc)
+    for _ in range(2):
+        conn = conns.get(key)
+        if conn is None:
+            if proxy is not None and scheme == "https":
+                # HTTPS is tunnelled with CONNECT, then TLS runs end to end.
+                conn = http.client.HTTPSConnection(proxy[0], timeout=timeout_s)
+                conn.set_tunnel(netloc, headers=dict(proxy[1]))
+            elif proxy is not None:
+                conn = http.client.HTTPConnection(proxy[0], timeout=timeout_s)
+            elif scheme == "https":
+                conn = http.client.HTTPSConnection(netloc, timeout=timeout_s)
+            else:
+                conn = http.client.HTTPConnection(netloc, timeout=timeout_s)
+            conns[key] = conn
+        reused = conn.sock is not None
+        try:
+            conn.request("GET", target, headers=headers)
+            return conn.getresponse()
+        except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+            # The server may close an idle keep-alive connection at any time;
+            # retry once on a fresh connection before reporting an error.
+            conns.pop(key, None)
+            conn.close()
+            if not reused:
+                raise
+    raise AssertionError("unreachable")
+
+
+def _get(url: str, headers: dict[str, str], timeout_s: float) -> http.client.HTTPResponse:
+    for _ in range(MAX_REDIRECTS + 1):
+        parts = urlsplit(url)
+        target = parts.path or "/"
+        if parts.query:
+            target += f"?{parts.query}"
+        resp = _send(parts.scheme, parts.netloc, target, headers, timeout_s)
+        location = resp.getheader("Location")
+        if resp.status not in REDIRECT_CODES or not location:
+            return resp
+        resp.read()
+        url = urljoin(url, location)
+    raise http.client.HTTPException(f"too many redirects ({MAX_REDIRECTS})")
+
+
 @dataclass(frozen=True)
 class DownloadResult:
     symbol_id: int
@@ -66,6 +213,8 @@ class DownloadResult:
     url: str
     path: str | None = None
     error: str | None = None
+    etag: str | None = None
+    last_modified: str | None = None
 
 
 def _download_one(
@@ -79,13 +228,27 @@ def _download_one(
     retries: int,
     retry_backoff_ms: int,
     user_agent: str,
+    validator: dict[str, str] | None = None,
 ) -> DownloadResult:
     url = f"{base_url.rstrip('/')}/{symbol_id}.png"
     out_path = out_dir / f"{symbol_id}.png"
-    if out_path.exists() and not overwrite:
+    if not overwrite and out_path.exists():
         return DownloadResult(symbol_id=symbol_id, status="skipped", url=url, path=str(out_path))
 
+    # out_dir is created once by the caller; only clean up the .part file
+    # when a write actually started and did not end in a rename.
     tmp_path = out_dir / f"{symbol_id}.png.part"
+    tmp_pending = False
+
+    headers = {"User-Agent": user_agent}
+    # When re-fetching a file we already have, send the validators stored
+    # from the last download so an unchanged image comes back as a bodiless
+    # 304 instead of being transferred again.
+    if validator and out_path.exists():
+        if validator.get("etag"):
+            headers["If-None-Match"] = validator["etag"]
+        if validator.get("last_modified"):
+            headers["If-Modified-Since"] = validator["last_modified"]
 
     if throttle_ms > 0:
         time.sleep(throttle_ms / 1000)
@@ -94,36 +257,49 @@ def _download_one(
         last_err: str | None = None
         for attempt in range(retries + 1):
             try:
-                req = Request(url, headers={"User-Agent": user_agent})
-                with urlopen(req, timeout=timeout_s) as resp:
-                    status = getattr(resp, "status", None) or 200
-                    if status != 200:
-                        last_err = f"HTTP {status}"
-                        raise URLError(last_err)
-                    content_type = (resp.headers.get("Content-Type") or "").lower()
-                    if "image/png" not in content_type:
+                resp = _get(url, headers, timeout_s)
+                if resp.status == 304:
+                    resp.read()
+                    return DownloadResult(
+                        symbol_id=symbol_id, status="skipped", url=url, path=str(out_path)
+                    )
+                content_type = (resp.getheader("Content-Type") or "").lower()
+                if resp.status != 200 or "image/png" not in content_type:
+                    # Drain the (small) body so the connection can be reused.
+                    resp.read()
+                    if resp.status == 404:
+                        return DownloadResult(
+                            symbol_id=symbol_id, status="not_found", url=url, error="HTTP 404"
+                        )
+                    if resp.status == 200:
                         return DownloadResult(
                             symbol_id=symbol_id,
                             status="error",
                             url=url,
                             error=f"unexpected content-type: {content_type or 'unknown'}",
                         )
-                    data = resp.read()
-                    ensure_dir(out_dir)
-                    tmp_path.write_bytes(data)
+                    last_err = f"HTTP {resp.status}"
+                else:
+                    buf = _scratch_buffer()
+                    tmp_pending = True
+                    with tmp_path.open("wb") as f:
+                        while n := resp.readinto(buf):
+                            f.write(buf[:n])
                     os.replace(tmp_path, out_path)
+                    tmp_pending = False
                     return DownloadResult(
-                        symbol_id=symbol_id, status="ok", url=url, path=str(out_path)
-                    )
-            except HTTPError as e:
-                if e.code == 404:
-                    return DownloadResult(
-                        symbol_id=symbol_id, status="not_found", url=url, error="HTTP 404"
+                        symbol_id=symbol_id,
+                        status="ok",
+                        url=url,
+                        path=str(out_path),
+                        etag=resp.getheader("ETag"),
+                        last_modified=resp.getheader("Last-Modified"),
                     )
-                last_err = f"HTTP {e.code}"
-            except (URLError, TimeoutError) as e:
-                last_err = str(e)
+            except (http.client.HTTPException, OSError) as e:
+                _reset_connections()
+                last_err = str(e) or repr(e)
             except Exception as e:  # noqa: BLE001
+                _reset_connections()
                 last_err = repr(e)
 
             if attempt < retries:
@@ -133,18 +309,21 @@ def _download_one(
             symbol_id=symbol_id, status="error", url=url, error=last_err or "unknown"
         )
     finally:
-        try:
-            tmp_path.unlink(missing_ok=True)
-        except Exception:
-            pass
+        if tmp_pending:
+            try:
+                tmp_path.unlink(missing_ok=True)
+            except Exception:
+                pass
 
 
 def filter_only_missing(ids: Iterable[int], out_dir: Path) -> list[int]:
-    out: list[int] = []
-    for i in ids:
-        if not (out_dir / f"{i}.png").exists():
-            out.append(i)
-    return out
+    # One directory listing instead of a stat() per id.
+    try:
+        with os.scandir(out_dir) as it:
+            present = {e.name for e in it if e.name.endswith(".png")}
+    except FileNotFoundError:
+        present = set()
+    return [i for i in ids if f"{i}.png" not in present]
 
 
 def main() -> None:
@@ -178,6 +357,15 @@ def main() -> None:
         help="Only download files not already present in --out.",
     )
     parser.add_argument("--overwrite", action="store_true", help="Overwrite existing files.")
+    parser.add_argument(
+        "--revalidate",
+        action="store_true",
+        help=(
+            "Re-check existing files with the ETag/Last-Modified stored from the last "
+            "download and only re-download those that changed on the server. Files "
+            "with no stored validator (e.g. on the first run) are downloaded again."
+        ),
+    )
     parser.add_argument(
         "--workers",
         type=int,
@@ -219,12 +407,12 @@ def main() -> None:
     if not args.csv and not args.ids:
         raise SystemExit("Provide either --csv or --ids.")
 
-    ids: list[int] = []
+    id_set: set[int] = set()
     if args.csv:
-        ids.extend(iter_ids_from_csv(args.csv, id_column=args.id_column))
+        id_set.update(iter_ids_from_csv(args.csv, id_column=args.id_column))
     if args.ids:
-        ids.extend(parse_ids_arg(args.ids))
-    ids = sorted(set(ids))
+        id_set.update(parse_ids_arg(args.ids))
+    ids = sorted(id_set)
 
     if args.only_missing and not args.overwrite:
         ids = filter_only_missing(ids, args.out)
@@ -233,36 +421,67 @@ def main() -> None:
         ids = ids[: args.max]
 
     ensure_dir(args.out)
+    validators = load_validators(args.out)
+    validators_changed = False
 
     user_agent = "BlissDownloader/1.0 (+https://example.invalid)"
     results: list[DownloadResult] = []
     started = time.time()
 
-    with ThreadPoolExecutor(max_workers=max(1, args.workers)) as ex:
-        futures = [
-            ex.submit(
-                _download_one,
-                symbol_id=i,
-                base_url=args.base_url,
-                out_dir=args.out,
-                timeout_s=args.timeout_s,
-                throttle_ms=args.throttle_ms,
-                overwrite=args.overwrite,
-                retries=max(0, args.retries),
-                retry_backoff_ms=max(0, args.retry_backoff_ms),
-                user_agent=user_agent,
-            )
-            for i in ids
-        ]
-        for fut in as_completed(futures):
+    # --overwrite always downloads again (e.g. to repair a corrupted file);
+    # only --revalidate sends the stored validators and accepts a 304.
+    revalidate = args.revalidate and not args.overwrite
+
+    workers = max(1, args.workers)
+    # Keep only a bounded window of ids queued on the pool instead of one
+    # future per id, so long id lists don't pin every pending task in memory.
+    max_in_flight = workers * 2
+
+    def report(done: Iterable[Future[DownloadResult]]) -> None:
+        nonlocal validators_changed
+        for fut in done:
             res = fut.result()
             results.append(res)
+            if res.status == "ok" and (res.etag or res.last_modified):
+                entry: dict[str, str] = {}
+                if res.etag:
+                    entry["etag"] = res.etag
+                if res.last_modified:
+                    entry["last_modified"] = res.last_modified
+                validators[str(res.symbol_id)] = entry
+                validators_changed = True
             if res.status in {"ok", "not_found", "error"}:
                 msg = res.status
                 if res.error:
                     msg += f" ({res.error})"
                 print(f"{res.symbol_id}: {msg}")
 
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        pending: set[Future[DownloadResult]] = set()
+        for i in ids:
+            if len(pending) >= max_in_flight:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                report(done)
+            pending.add(
+                ex.submit(
+                    _download_one,
+                    symbol_id=i,
+                    base_url=args.base_url,
+                    out_dir=args.out,
+                    timeout_s=args.timeout_s,
+                    throttle_ms=args.throttle_ms,
+                    overwrite=args.overwrite or args.revalidate,
+                    retries=max(0, args.retries),
+                    retry_backoff_ms=max(0, args.retry_backoff_ms),
+                    user_agent=user_agent,
+                    validator=validators.get(str(i)) if revalidate else None,
+                )
+            )
+        report(as_completed(pending))
+    close_connections()
+    if validators_changed:
+        save_validators(args.out, validators)
+
     elapsed_s = time.time() - started
     summary = {
         "base_url": args.base_url,
@@ -2,10 +2,15 @@
 from __future__ import annotations
 
 import argparse
+import contextlib
 import csv
+from operator import itemgetter
 from pathlib import Path
 
 
+OUT_FIELDNAMES = ["BCI-AV#", "English", "POS", "Derivation - explanation", "WinBliss"]
+
+
 def main() -> None:
     parser = argparse.ArgumentParser(
         description="Extract rows whose English derivation contains '- Character'."
@@ -31,6 +36,11 @@ def main() -> None:
         "--pos",
         help="Optional POS filter (comma-separated, e.g. YELLOW,WHITE).",
     )
+    parser.add_argument(
+        "--no-sort",
+        action="store_true",
+        help="Write matches in input order as they are found instead of sorting by id.",
+    )
     args = parser.parse_args()
 
     src = args.csv
@@ -40,45 +50,76 @@ def main() -> None:
     if args.pos:
         pos_filter = {p.strip().upper() for p in args.pos.split(",") if p.strip()}
 
-    with src.open("r", encoding="utf-8", newline="") as f:
-        reader = csv.DictReader(f)
-        if not reader.fieldnames:
+    if args.no_sort and out.resolve() == src.resolve():
+        raise SystemExit("--no-sort streams rows while reading, so --out must differ from --csv.")
+
+    with contextlib.ExitStack() as stack:
+        f = stack.enter_context(src.open("r", encoding="utf-8", newline=""))
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if not header:
             raise SystemExit(f"No header found in {src}")
 
         required = {"BCI-AV#", "English", "Derivation - explanation", "POS", "WinBliss"}
-        missing = [c for c in required if c not in reader.fieldnames]
+        missing = [c for c in required if c not in header]
         if missing:
-            raise SystemExit(f"Missing columns in {src}: {missing}. Found: {reader.fieldnames}")
+            raise SystemExit(f"Missing columns in {src}: {missing}. Found: {header}")
+
+        # Index the handful of columns we need instead of building a dict
+        # over every column of every row.
+        id_idx = header.index("BCI-AV#")
+        en_idx = header.index("English")
+        pos_idx = header.index("POS")
+        deriv_idx = header.index("Derivation - explanation")
+        wb_idx = header.index("WinBliss")
+        width = len(header)
+
+        # With --no-sort each match is written as soon as it is found, so
+        # memory stays flat; otherwise matches are buffered for the sort and
+        # the output is only opened once the input has been read in full.
+        writer = None
+        if args.no_sort:
+            out.parent.mkdir(parents=True, exist_ok=True)
+            out_f = stack.enter_context(out.open("w", encoding="utf-8", newline=""))
+            writer = csv.writer(out_f)
+            writer.writerow(OUT_FIELDNAMES)
 
         rows = []
+        count = 0
         for row in reader:
-            deriv = (row.get("Derivation - explanation") or "")
+            if not row:
+                continue
+            if len(row) < width:
+                row += [""] * (width - len(row))
+            deriv = row[deriv_idx]
             if substring in deriv:
-                pos = (row.get("POS") or "").strip()
-                if pos_filter and pos.strip().upper() not in pos_filter:
+                pos = row[pos_idx].strip()
+                if pos_filter and pos.upper() not in pos_filter:
                     continue
-                rows.append(
-                    {
-                        "BCI-AV#": (row.get("BCI-AV#") or "").strip(),
-                        "English": (row.get("English") or "").strip(),
-                        "POS": pos,
-                        "Derivation - explanation": deriv.strip(),
-                        "WinBliss": (row.get("WinBliss") or "").strip(),
-                    }
+                symbol_id = row[id_idx].strip()
+                record = (
+                    symbol_id,
+                    row[en_idx].strip(),
+                    pos,
+                    deriv.strip(),
+                    row[wb_idx].strip(),
                 )
+                count += 1
+                if writer is not None:
+                    writer.writerow(record)
+                else:
+                    sort_id = int(symbol_id) if symbol_id.isdigit() else 0
+                    rows.append((sort_id, record))
 
-    rows.sort(key=lambda r: int(r["BCI-AV#"]) if r["BCI-AV#"].isdigit() else 0)
-
-    out.parent.mkdir(parents=True, exist_ok=True)
-    with out.open("w", encoding="utf-8", newline="") as f:
-        writer = csv.DictWriter(
-            f,
-            fieldnames=["BCI-AV#", "English", "POS", "Derivation - explanation", "WinBliss"],
-        )
-        writer.writeheader()
-        writer.writerows(rows)
+    if writer is None:
+        rows.sort(key=itemgetter(0))
+        out.parent.mkdir(parents=True, exist_ok=True)
+        with out.open("w", encoding="utf-8", newline="") as out_f:
+            writer = csv.writer(out_f)
+            writer.writerow(OUT_FIELDNAMES)
+            writer.writerows(r for _, r in rows)
 
-    print(f"Wrote {len(rows)} rows to {out}")
+    print(f"Wrote {count} rows to {out}")
 
 
 if __name__ == "__main__":
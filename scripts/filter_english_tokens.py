@@ -5,16 +5,43 @@ import argparse
 import csv
 import re
 from pathlib import Path
+from typing import Callable
 
 
-def normalize_english_to_tokens(english: str) -> set[str]:
+_PAREN_RE = re.compile(r"\([^)]*\)")
+_TOKEN_RE = re.compile(r"[a-z0-9_]+")
+_HYPHEN_TO_UNDERSCORE = str.maketrans({"-": "_"})
+
+
+def english_tokens(english: str) -> list[str]:
     s = (english or "").lower()
     s = s.replace("-(to)", "")
-    s = re.sub(r"\([^)]*\)", " ", s)
-    s = s.replace("-", "_")
-    s = re.sub(r"[^a-z0-9_]+", " ", s)
-    tokens = {t for t in s.split() if t}
-    return tokens
+    s = _PAREN_RE.sub(" ", s).translate(_HYPHEN_TO_UNDERSCORE)
+    return _TOKEN_RE.findall(s)
+
+
+def normalize_english_to_tokens(english: str) -> set[str]:
+    return set(english_tokens(english))
+
+
+def build_matcher(allow: set[str], min_matches: int) -> Callable[[str], bool]:
+    if min_matches <= 0:
+        return lambda english: True
+    if min_matches == 1:
+        return lambda english: any(t in allow for t in english_tokens(english))
+
+    # Count distinct allowlist hits in one pass over the tokens and stop as
+    # soon as the threshold is reached, without building the row's token set.
+    def matches(english: str) -> bool:
+        hits: set[str] = set()
+        for t in english_tokens(english):
+            if t in allow:
+                hits.add(t)
+                if len(hits) >= min_matches:
+                    return True
+        return False
+
+    return matches
 
 
 def read_allowlist(path: Path) -> set[str]:
@@ -96,6 +123,7 @@ def main() -> None:
     args = parser.parse_args()
 
     allow = read_allowlist(args.allowlist)
+    matches = build_matcher(allow, args.min_matches)
     pos_filter = None
     if args.pos:
         pos_filter = {p.strip().upper() for p in args.pos.split(",") if p.strip()}
@@ -104,57 +132,66 @@ def main() -> None:
         exclude_ids = read_exclude_ids(args.exclude_ids_file)
 
     with args.in_path.open("r", encoding="utf-8", newline="") as f:
-        reader = csv.DictReader(f)
-        if not reader.fieldnames:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if not header:
             raise SystemExit(f"No header found in {args.in_path}")
-        if args.english_column not in reader.fieldnames:
+        if args.english_column not in header:
             raise SystemExit(
-                f"Missing column {args.english_column!r} in {args.in_path}. Found: {reader.fieldnames}"
+                f"Missing column {args.english_column!r} in {args.in_path}. Found: {header}"
             )
-        if args.pos_column not in reader.fieldnames:
+        if args.pos_column not in header:
             if pos_filter:
                 raise SystemExit(
-                    f"Missing POS column {args.pos_column!r} in {args.in_path}. Found: {reader.fieldnames}"
+                    f"Missing POS column {args.pos_column!r} in {args.in_path}. Found: {header}"
                 )
-        if args.derivation_column not in reader.fieldnames:
+        if args.derivation_column not in header:
             if args.derivation_substring:
                 raise SystemExit(
-                    f"Missing derivation column {args.derivation_column!r} in {args.in_path}. Found: {reader.fieldnames}"
+                    f"Missing derivation column {args.derivation_column!r} in {args.in_path}. Found: {header}"
                 )
 
+        out_fieldnames = header
+        if args.select:
+            requested = [c.strip() for c in args.select.split(",") if c.strip()]
+            missing = [c for c in requested if c not in header]
+            if missing:
+                raise SystemExit(f"Requested columns not in input: {missing}")
+            out_fieldnames = requested
+
+        # Resolve column indices once so the cheap predicates run against the
+        # raw row list; only rows that pass get an output row built.
+        col = {c: i for i, c in enumerate(header)}
+        width = len(header)
+        en_idx = col[args.english_column]
+        id_idx = col.get(args.id_column)
+        pos_idx = col.get(args.pos_column)
+        deriv_idx = col.get(args.derivation_column)
+        out_idx = [col[c] for c in out_fieldnames]
+
         rows = []
         for row in reader:
-            if exclude_ids:
-                symbol_id = (row.get(args.id_column) or "").strip()
-                if symbol_id in exclude_ids:
+            if not row:
+                continue
+            if len(row) < width:
+                row += [""] * (width - len(row))
+            if exclude_ids and id_idx is not None:
+                if row[id_idx].strip() in exclude_ids:
                     continue
             if pos_filter:
-                pos = (row.get(args.pos_column) or "").strip().upper()
-                if pos not in pos_filter:
+                if row[pos_idx].strip().upper() not in pos_filter:
                     continue
             if args.derivation_substring:
-                deriv = row.get(args.derivation_column) or ""
-                if args.derivation_substring not in deriv:
+                if args.derivation_substring not in row[deriv_idx]:
                     continue
-            tokens = normalize_english_to_tokens(row.get(args.english_column) or "")
-            hits = tokens & allow
-            if len(hits) >= args.min_matches:
-                rows.append(row)
+            if matches(row[en_idx]):
+                rows.append([row[i] for i in out_idx])
 
     args.out.parent.mkdir(parents=True, exist_ok=True)
-    out_fieldnames = reader.fieldnames
-    if args.select:
-        requested = [c.strip() for c in args.select.split(",") if c.strip()]
-        missing = [c for c in requested if c not in (reader.fieldnames or [])]
-        if missing:
-            raise SystemExit(f"Requested columns not in input: {missing}")
-        out_fieldnames = requested
-
     with args.out.open("w", encoding="utf-8", newline="") as f:
-        writer = csv.DictWriter(f, fieldnames=out_fieldnames)
-        writer.writeheader()
-        for row in rows:
-            writer.writerow({k: row.get(k, "") for k in out_fieldnames})
+        writer = csv.writer(f)
+        writer.writerow(out_fieldnames)
+        writer.writerows(rows)
 
     print(f"Wrote {len(rows)} rows to {args.out}")
 
@@ -2,24 +2,50 @@
 from __future__ import annotations
 
 import argparse
+import contextlib
 import csv
+import hashlib
+import json
 import os
+import random
 import re
 import shutil
 import subprocess
 import sys
+import threading
 import time
-from dataclasses import dataclass
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ThreadPoolExecutor,
+    as_completed,
+    wait,
+)
+from dataclasses import asdict, dataclass
 from pathlib import Path
+from typing import Any, Callable
+
+try:
+    from tqdm import tqdm
+except ImportError:  # optional; falls back to one line per image
+    tqdm = None  # type: ignore[assignment]
+
+
+BREAKER_THRESHOLD = 5
+BREAKER_COOLDOWN_S = 30.0
+MAX_BACKOFF_S = 60.0
+# Kept out of the output directory: public/ is copied verbatim into dist/.
+DEFAULT_STATE_FILE = Path(".generate_pictos_state.jsonl")
+
+
+_PAREN_RE = re.compile(r"\([^)]*\)")
+_WS_RE = re.compile(r"\s+")
+_SEPARATORS_TO_SPACE = str.maketrans({"_": " ", "-": " "})
 
 
 def normalize_phrase(s: str) -> str:
-    s = (s or "").strip()
-    s = re.sub(r"\([^)]*\)", " ", s)
-    s = s.replace("_", " ")
-    s = s.replace("-", " ")
-    s = re.sub(r"\s+", " ", s).strip()
-    return s
+    s = _PAREN_RE.sub(" ", (s or "").strip()).translate(_SEPARATORS_TO_SPACE)
+    return _WS_RE.sub(" ", s).strip()
 
 
 def primary_concept(english_field: str) -> str:
@@ -29,7 +55,16 @@ def primary_concept(english_field: str) -> str:
     return normalize_phrase(first)
 
 
-@dataclass(frozen=True)
+def compile_prompt_template(template: str) -> Callable[[str], str]:
+    # The template is fixed for the whole run: when {concept} is its only
+    # placeholder, split it once and build each prompt by concatenation.
+    prefix, sep, suffix = template.partition("{concept}")
+    if sep and not any(c in prefix + suffix for c in "{}"):
+        return lambda concept: prefix + concept + suffix
+    return lambda concept: template.format(concept=concept)
+
+
+@dataclass(frozen=True, slots=True)
 class FluxParams:
     width: int
     height: int
@@ -49,26 +84,185 @@ class FluxParams:
     clip_skip: int
 
 
-def build_gradio_args(prompt: str, p: FluxParams) -> list[object]:
-    return [
-        prompt,
-        p.width,
-        p.height,
-        p.seed,
-        p.steps,
-        p.sampler_name,
-        p.scheduler,
-        p.guidance,
-        p.lora1_source,
-        p.lora1_url,
-        p.lora1_strength_model,
-        p.lora1_strength_clip,
-        p.lora2_source,
-        p.lora2_url,
-        p.lora2_strength_model,
-        p.lora2_strength_clip,
-        p.clip_skip,
-    ]
+@dataclass(frozen=True, slots=True)
+class GenerateResult:
+    symbol_id: str
+    status: str  # ok | error | save_error
+    path: str | None = None
+    error: str | None = None
+
+
+class RateLimiter:
+    # Paces requests to at most rate_per_min, spacing them evenly rather than
+    # sleeping a fixed time after each one. Failures halve the working rate
+    # (down to 1/16 of the limit) and each success wins back 1/10 of the
+    # limit, so a struggling endpoint is backed off without a retry storm.
+    def __init__(self, rate_per_min: float) -> None:
+        self._max_rate = max(0.0, rate_per_min) / 60.0
+        self._rate = self._max_rate
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        if self._max_rate <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + 1.0 / self._rate
+        if start > now:
+            time.sleep(start - now)
+
+    def on_success(self) -> None:
+        with self._lock:
+            self._rate = min(self._max_rate, self._rate + self._max_rate / 10)
+
+    def on_failure(self) -> None:
+        with self._lock:
+            self._rate = max(self._max_rate / 16, self._rate / 2)
+
+
+def _save_result(tmp: Path, out_path: Path) -> None:
+    # gradio_client caches downloads by content hash, so two calls that get
+    # identical images share one temp path: hard-link (or, across devices,
+    # copy) it to a .part file and rename that, rather than moving gradio's
+    # file away from under the other worker.
+    tmp_out = out_path.with_suffix(".png.part")
+    try:
+        os.link(tmp, tmp_out)
+    except OSError:
+        shutil.copyfile(tmp, tmp_out)
+    os.replace(tmp_out, out_path)
+
+
+class CircuitBreaker:
+    # Shared across workers: after BREAKER_THRESHOLD consecutive failed calls
+    # the endpoint is assumed down, and every worker holds off for
+    # BREAKER_COOLDOWN_S instead of submitting requests that will fail.
+    def __init__(self, log: Callable[[str], None]) -> None:
+        self._log = log
+        self._failures = 0
+        self._open_until = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self) -> None:
+        with self._lock:
+            delay = self._open_until - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def on_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+
+    def on_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._failures < BREAKER_THRESHOLD:
+                return
+            self._failures = 0
+            self._open_until = time.monotonic() + BREAKER_COOLDOWN_S
+        self._log(f"{BREAKER_THRESHOLD} consecutive failures; pausing {BREAKER_COOLDOWN_S:g}s")
+
+
+def _is_retryable(e: Exception) -> bool:
+    # Client errors (bad request, auth, ...) will fail the same way again;
+    # timeouts, rate limiting, 5xx and connection problems are worth a retry.
+    status = getattr(getattr(e, "response", None), "status_code", None)
+    if isinstance(status, int) and 400 <= status < 500:
+        return status in {408, 429}
+    return not isinstance(e, (TypeError, ValueError))
+
+
+def _generate_one(
+    *,
+    client: Any,
+    symbol_id: str,
+    gradio_args: tuple[object, ...],
+    out_path: Path,
+    limiter: RateLimiter,
+    breaker: CircuitBreaker,
+    retries: int,
+    retry_backoff_ms: int,
+) -> GenerateResult:
+    for attempt in range(retries + 1):
+        breaker.wait()
+        limiter.acquire()
+        try:
+            result_path = client.predict(*gradio_args, api_name="/generate")
+            break
+        except Exception as e:
+            limiter.on_failure()
+            breaker.on_failure()
+            if attempt >= retries or not _is_retryable(e):
+                return GenerateResult(symbol_id=symbol_id, status="error", error=str(e))
+            backoff_s = (retry_backoff_ms / 1000) * (2**attempt)
+            time.sleep(min(MAX_BACKOFF_S, backoff_s + random.uniform(0, backoff_s / 2)))
+    limiter.on_success()
+    breaker.on_success()
+
+    try:
+        tmp = Path(str(result_path))
+        if not tmp.exists():
+            raise FileNotFoundError(str(tmp))
+        _save_result(tmp, out_path)
+    except Exception as e:
+        return GenerateResult(symbol_id=symbol_id, status="save_error", error=str(e))
+    return GenerateResult(symbol_id=symbol_id, status="ok", path=str(out_path))
+
+
+def params_hash(params: FluxParams, prompt_template: str, out_dir: Path) -> str:
+    # The output directory is part of the key: one state file can serve runs
+    # into several directories without one run's ids skipping another's.
+    payload = {
+        "params": asdict(params),
+        "prompt_template": prompt_template,
+        "out_dir": str(out_dir.resolve()),
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def load_generated_ids(state_path: Path, current_hash: str, out_dir: Path) -> set[str]:
+    # Entries written under different parameters are ignored, so changing
+    # any generation setting invalidates them, and so are entries whose PNG
+    # has since been deleted.
+    out: set[str] = set()
+    try:
+        lines = state_path.read_text(encoding="utf-8").splitlines()
+    except FileNotFoundError:
+        return out
+    for line in lines:
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            continue
+        if isinstance(entry, dict) and entry.get("hash") == current_hash:
+            out.add(str(entry.get("id")))
+    if out:
+        with os.scandir(out_dir) as it:
+            present = {e.name[:-4] for e in it if e.name.endswith(".png")}
+        out &= present
+    return out
+
+
+def _print_err(msg: str, bar: Any = None) -> None:
+    # Through the bar, so the message lands above it instead of over it.
+    if bar is not None:
+        bar.write(msg, file=sys.stderr)
+    else:
+        print(msg, file=sys.stderr)
+
+
+def _report(res: GenerateResult, bar: Any = None) -> None:
+    if bar is not None:
+        bar.update(1)
+        bar.set_postfix_str(res.symbol_id, refresh=False)
+    if res.status == "ok":
+        if bar is None:
+            print(f"{res.symbol_id}: ok -> {res.path}")
+        return
+    label = "SAVE_ERROR" if res.status == "save_error" else "ERROR"
+    _print_err(f"{res.symbol_id}: {label} {res.error}", bar)
 
 
 def _in_venv() -> bool:
@@ -173,25 +367,77 @@ def main() -> None:
         "--seed",
         type=int,
         default=0,
-        help="0 means random (default: 0).",
+        help="Fixed seed for every image; 0 draws a random seed per image (default: 0).",
+    )
+    parser.add_argument(
+        "--retries",
+        type=int,
+        default=2,
+        help="Retries for transient generation errors (default: 2).",
+    )
+    parser.add_argument(
+        "--retry-backoff-ms",
+        type=int,
+        default=2000,
+        help="Base backoff between retries in ms, doubled per attempt (default: 2000).",
+    )
+    parser.add_argument(
+        "--rate-per-min",
+        type=float,
+        default=0.0,
+        help="Maximum generation requests started per minute; 0 means unlimited (default: 0).",
     )
     parser.add_argument(
         "--sleep-s",
         type=float,
         default=0.0,
-        help="Sleep between requests (default: 0).",
+        help="Minimum spacing between requests; shorthand for --rate-per-min 60/N (default: 0).",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=4,
+        help="Number of generation requests in flight at once (default: 4).",
     )
     parser.add_argument(
         "--limit",
         type=int,
         default=0,
-        help="Limit number of images generated (0 means all).",
+        help=(
+            "Limit the number of rows attempted (0 means all). Rows that fail and "
+            "duplicates copied from an earlier row count toward the limit."
+        ),
     )
     parser.add_argument(
         "--overwrite",
         action="store_true",
         help="Overwrite existing images.",
     )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help=(
+            "Record generated ids in --state-file and skip ids already recorded there "
+            "with the same parameters (pass it on the first run too, e.g. to resume an "
+            "interrupted --overwrite run)."
+        ),
+    )
+    parser.add_argument(
+        "--state-file",
+        type=Path,
+        default=DEFAULT_STATE_FILE,
+        help=f"State log used by --resume (default: {DEFAULT_STATE_FILE}).",
+    )
+    parser.add_argument(
+        "--no-dedupe",
+        action="store_true",
+        help="Generate every row, even when its concept matches an earlier row's.",
+    )
+    parser.add_argument(
+        "--no-progress",
+        action="store_true",
+        help="Print one line per image instead of a tqdm progress bar.",
+    )
     parser.add_argument(
         "--auto-install-deps",
         action="store_true",
@@ -222,6 +468,40 @@ def main() -> None:
         lora2_strength_clip=1.0,
         clip_skip=0,
     )
+    # Only the prompt (and, with --seed 0, the seed) changes from row to row,
+    # so the /generate arguments around the seed are laid out once here. The
+    # endpoint's positional order is: prompt, width, height, seed, steps, ...
+    args_before_seed = (p.width, p.height)
+    args_after_seed = (
+        p.steps,
+        p.sampler_name,
+        p.scheduler,
+        p.guidance,
+        p.lora1_source,
+        p.lora1_url,
+        p.lora1_strength_model,
+        p.lora1_strength_clip,
+        p.lora2_source,
+        p.lora2_url,
+        p.lora2_strength_model,
+        p.lora2_strength_clip,
+        p.clip_skip,
+    )
+    # --seed 0 asks for a random image: draw a fresh 32-bit seed per row rather
+    # than sending 0 every time, which the endpoint may treat as fixed.
+    random_seed = p.seed == 0
+
+    try:
+        args.prompt_template.format(concept="")
+    except (AttributeError, IndexError, KeyError, TypeError, ValueError) as e:
+        raise SystemExit(f"Invalid --prompt-template (only {{concept}} is supported): {e!r}")
+    build_prompt = compile_prompt_template(args.prompt_template)
+
+    run_hash = params_hash(p, args.prompt_template, out_dir)
+    state_path: Path = args.state_file
+    generated: set[str] = set()
+    if args.resume:
+        generated = load_generated_ids(state_path, run_hash, out_dir)
 
     client = Client(args.endpoint)
 
@@ -230,54 +510,157 @@ def main() -> None:
     if args.ids:
         only_ids = {p.strip() for p in args.ids.split(",") if p.strip()}
 
-    with args.in_csv.open("r", encoding="utf-8", newline="") as f:
-        reader = csv.DictReader(f)
-        if not reader.fieldnames:
-            raise SystemExit(f"No header found in {args.in_csv}")
-        if "BCI-AV#" not in reader.fieldnames or "English" not in reader.fieldnames:
-            raise SystemExit(
-                f"Expected columns BCI-AV# and English in {args.in_csv}. Found: {reader.fieldnames}"
-            )
+    # List the output directory once so rows that are already done are
+    # skipped before any normalization or prompt building. With --overwrite
+    # nothing is listed and the per-row check is skipped entirely.
+    check_exists = not args.overwrite
+    existing_ids: set[str] = set()
+    if check_exists:
+        with os.scandir(out_dir) as it:
+            existing_ids = {e.name[:-4] for e in it if e.name.endswith(".png")}
+
+    rate_per_min = args.rate_per_min
+    if rate_per_min <= 0 and args.sleep_s and args.sleep_s > 0:
+        rate_per_min = 60.0 / args.sleep_s
+    limiter = RateLimiter(rate_per_min)
+
+    dedupe = not args.no_dedupe
+    first_by_concept: dict[str, str] = {}
+    duplicates: list[tuple[str, str, Path]] = []
+    # Duplicates are only copied from a first row that succeeded in this run,
+    # never from whatever file happened to be at its path already.
+    results_by_id: dict[str, GenerateResult] = {}
+
+    # Producer/consumer: this thread scans the CSV and submits rows, while
+    # the pool's workers each block on a predict() round-trip and then save
+    # the result, so parsing, network wait and disk writes overlap. Only a
+    # bounded window of rows is queued at a time.
+    concurrency = max(1, args.concurrency)
+    max_in_flight = concurrency * 2
+
+    # With tqdm installed and a terminal attached, every result ticks a single
+    # progress line (redrawn at most ~10 times a second) and errors are
+    # written above it; otherwise keep the plain per-image log.
+    bar = None
+    if tqdm is not None and not args.no_progress and sys.stderr.isatty():
+        bar = tqdm(total=args.limit or None, unit="img", mininterval=0.1)
+    breaker = CircuitBreaker(lambda msg: _print_err(msg, bar))
 
-        for row in reader:
-            symbol_id = (row.get("BCI-AV#") or "").strip()
-            if not symbol_id.isdigit():
-                continue
-            if only_ids is not None and symbol_id not in only_ids:
-                continue
-            concept = primary_concept(row.get("English") or "")
-            if not concept:
-                continue
-
-            out_path = out_dir / f"{symbol_id}.png"
-            if out_path.exists() and not args.overwrite:
-                continue
-
-            prompt = args.prompt_template.format(concept=concept)
-            gradio_args = build_gradio_args(prompt, p)
-
-            try:
-                result_path = client.predict(*gradio_args, api_name="/generate")
-            except Exception as e:
-                print(f"{symbol_id}: ERROR {e}", file=sys.stderr)
-                continue
-
-            try:
-                tmp = Path(str(result_path))
-                if not tmp.exists():
-                    raise FileNotFoundError(str(tmp))
-                tmp_out = out_path.with_suffix(".png.part")
-                shutil.copyfile(tmp, tmp_out)
-                os.replace(tmp_out, out_path)
-                print(f"{symbol_id}: ok -> {out_path}")
-            except Exception as e:
-                print(f"{symbol_id}: SAVE_ERROR {e}", file=sys.stderr)
-
-            count += 1
-            if args.limit and count >= args.limit:
-                break
-            if args.sleep_s and args.sleep_s > 0:
-                time.sleep(args.sleep_s)
+    try:
+        # With --resume, append every successful save to the state log as it is
+        # reported, so an interrupted run can pick up where it stopped.
+        state_cm: Any = contextlib.nullcontext()
+        if args.resume:
+            state_path.parent.mkdir(parents=True, exist_ok=True)
+            state_cm = state_path.open("a", encoding="utf-8")
+        with state_cm as state_log:
+
+            def record(res: GenerateResult) -> None:
+                _report(res, bar)
+                results_by_id[res.symbol_id] = res
+                if state_log is not None and res.status == "ok":
+                    entry = {"id": res.symbol_id, "hash": run_hash, "mtime": time.time()}
+                    state_log.write(json.dumps(entry) + "\n")
+                    state_log.flush()
+
+            with ThreadPoolExecutor(max_workers=concurrency) as ex:
+                pending: set[Future[GenerateResult]] = set()
+                with args.in_csv.open("r", encoding="utf-8", newline="") as f:
+                    reader = csv.reader(f)
+                    header = next(reader, None)
+                    if not header:
+                        raise SystemExit(f"No header found in {args.in_csv}")
+                    if "BCI-AV#" not in header or "English" not in header:
+                        raise SystemExit(
+                            f"Expected columns BCI-AV# and English in {args.in_csv}. Found: {header}"
+                        )
+                    # Only two columns are read, so index them instead of building a
+                    # dict for every row.
+                    id_idx = header.index("BCI-AV#")
+                    en_idx = header.index("English")
+
+                    for row in reader:
+                        if len(row) <= max(id_idx, en_idx):
+                            continue
+                        symbol_id = row[id_idx].strip()
+                        if not symbol_id.isdigit():
+                            continue
+                        if only_ids is not None and symbol_id not in only_ids:
+                            continue
+                        if check_exists and symbol_id in existing_ids:
+                            continue
+                        if symbol_id in generated:
+                            continue
+                        concept = primary_concept(row[en_idx])
+                        if not concept:
+                            continue
+
+                        out_path = out_dir / f"{symbol_id}.png"
+                        if dedupe:
+                            # Same concept means the same prompt: reuse the first row's
+                            # image once it is generated instead of paying for another call.
+                            first_id = first_by_concept.get(concept)
+                            if first_id is not None:
+                                duplicates.append((symbol_id, first_id, out_path))
+                                count += 1
+                                if args.limit and count >= args.limit:
+                                    break
+                                continue
+                            first_by_concept[concept] = symbol_id
+
+                        prompt = build_prompt(concept)
+                        seed = int.from_bytes(os.urandom(4), "little") if random_seed else p.seed
+                        gradio_args = (prompt, *args_before_seed, seed, *args_after_seed)
+                        # Reap whatever has finished on every row, but only block
+                        # (backpressure on the CSV scan) when the window is full.
+                        done, pending = wait(
+                            pending,
+                            timeout=None if len(pending) >= max_in_flight else 0,
+                            return_when=FIRST_COMPLETED,
+                        )
+                        for fut in done:
+                            record(fut.result())
+                        pending.add(
+                            ex.submit(
+                                _generate_one,
+                                client=client,
+                                symbol_id=symbol_id,
+                                gradio_args=gradio_args,
+                                out_path=out_path,
+                                limiter=limiter,
+                                breaker=breaker,
+                                retries=max(0, args.retries),
+                                retry_backoff_ms=max(0, args.retry_backoff_ms),
+                            )
+                        )
+
+                        count += 1
+                        if args.limit and count >= args.limit:
+                            break
+
+                for fut in as_completed(pending):
+                    record(fut.result())
+
+            for symbol_id, first_id, out_path in duplicates:
+                first = results_by_id.get(first_id)
+                if first is None or first.status != "ok":
+                    record(
+                        GenerateResult(
+                            symbol_id=symbol_id,
+                            status="error",
+                            error=f"not copied: {first_id} (same concept) was not generated",
+                        )
+                    )
+                    continue
+                try:
+                    _save_result(Path(first.path), out_path)
+                except Exception as e:
+                    record(GenerateResult(symbol_id=symbol_id, status="save_error", error=str(e)))
+                    continue
+                record(GenerateResult(symbol_id=symbol_id, status="ok", path=str(out_path)))
+    finally:
+        if bar is not None:
+            bar.close()
 
 
 if __name__ == "__main__":